@@ -9,20 +9,21 @@ import trimesh as tm
 
 from .types import MakeSocketOptions, MakeSocketResult
 from .io import load_mesh, check_units_mm, save_mesh, save_json, sha256_file, apply_scale
-from .offset import make_shell_inner_outer, trim_with_plane_volumetric, auto_voxel_mm
+from .offset import make_shell_inner_outer, trim_field_with_plane, auto_voxel_mm
 from .qc import compute_sections, write_sections_csv
 from .prov import write_provenance
 from .preprocess import normalize_pose
 
 
 def make_socket(opts: MakeSocketOptions) -> MakeSocketResult:
-    limb = load_mesh(opts.limb_path)
+    limb = load_mesh(opts.limb_path, repair=opts.repair_input)
+    # Bbox center in the file's own frame (load_mesh rezeros); scaled to mm once units are settled
+    limb_center = limb.bounds.mean(axis=0) + limb.metadata.get("rezero_offset", 0.0)
     ok_units, bbox = check_units_mm(limb)
     scale_applied = 1.0
-    # Optional explicit scaling can override heuristics (injected via parsed args in main)
-    # Note: parsed args are only known inside main; here we rely on environment via attributes set there.
-    assume_units = getattr(opts, "assume_units", None)
-    scale_factor = getattr(opts, "scale_factor", None)
+    # Optional explicit scaling can override heuristics
+    assume_units = opts.assume_units
+    scale_factor = opts.scale_factor
 
     if scale_factor is not None and scale_factor > 0:
         limb = apply_scale(limb, float(scale_factor))
@@ -56,11 +57,15 @@ def make_socket(opts: MakeSocketOptions) -> MakeSocketResult:
     # For very small meshes, force a finer voxel pitch
     if max(bbox) < 100.0:
         voxel_mm = min(voxel_mm, 0.4)
-    inner, outer, shell = make_shell_inner_outer(limb, opts.base_clearance_mm, opts.wall_thickness_mm, voxel_mm, marks=getattr(opts, 'marks', None))
+    inner, outer, shell, (shell_sdf, origin, voxel_mm) = make_shell_inner_outer(
+        limb, opts.base_clearance_mm, opts.wall_thickness_mm, voxel_mm, marks=opts.marks, return_field=True
+    )
 
     trimmed = shell
     if opts.trim_z_mm is not None:
-        trimmed = trim_with_plane_volumetric(shell, voxel_mm, opts.trim_z_mm)
+        # Cut the shell's own field instead of re-voxelizing the shell mesh
+        trimmed = trim_field_with_plane(shell_sdf, origin, voxel_mm, opts.trim_z_mm)
+    del shell_sdf
 
     os.makedirs(opts.outdir, exist_ok=True)
     socket_inner_path = os.path.join(opts.outdir, "socket_inner.stl")
@@ -92,8 +97,8 @@ def make_socket(opts: MakeSocketOptions) -> MakeSocketResult:
             "normalized": True,
         },
     }
-    if getattr(opts, 'marks', None):
-        params["marks"] = getattr(opts, 'marks')
+    if opts.marks:
+        params["marks"] = opts.marks
     stats = {
         "bbox_mm": [float(bbox[0]), float(bbox[1]), float(bbox[2])],
     "faces": int(trimmed.faces.shape[0]),
@@ -113,6 +118,9 @@ def make_socket(opts: MakeSocketOptions) -> MakeSocketResult:
         sections_csv_path=sections_csv_path,
         provenance_path=provenance_path,
         stats=stats,
+        limb_center_mm=(limb_center * scale_applied).tolist(),
+        socket_center_mm=trimmed.bounds.mean(axis=0).tolist(),
+        scale_applied=scale_applied,
     )
 
 
@@ -127,6 +135,7 @@ def build_arg_parser() -> argparse.ArgumentParser:
     m.add_argument("--trim-z-mm", type=float, default=None)
     m.add_argument("--voxel-mm", type=float, default=None)
     m.add_argument("--decimate-preview", action="store_true")
+    m.add_argument("--repair-input", action="store_true", help="Fill holes and fix normals of the input mesh before processing.")
     m.add_argument("--assume-units", choices=["mm", "cm", "m"], default=None, help="If provided, rescale to mm from these units before processing.")
     m.add_argument("--scale-factor", type=float, default=None, help="Explicit scale applied to the mesh before processing (e.g., 1000 for m→mm).")
     return p
@@ -144,10 +153,10 @@ def main(argv: Optional[List[str]] = None) -> int:
             trim_z_mm=args.trim_z_mm,
             voxel_mm=args.voxel_mm,
             decimate_preview=args.decimate_preview,
+            repair_input=args.repair_input,
+            assume_units=args.assume_units,
+            scale_factor=args.scale_factor,
         )
-        # Attach optional scaling knobs to opts dynamically
-        setattr(opts, "assume_units", args.assume_units)
-        setattr(opts, "scale_factor", args.scale_factor)
         res = make_socket(opts)
     print("Socket written:", res.socket_trimmed_path)
     return 0
@@ -6,25 +6,18 @@ import trimesh as tm
 
 
 def generate_tapered_cylinder(height_mm: float = 200.0, r_top_mm: float = 40.0, r_bottom_mm: float = 60.0, segments: int = 128) -> tm.Trimesh:
-    zs = np.array([0.0, height_mm])
-    rs = np.array([r_bottom_mm, r_top_mm])
     theta = np.linspace(0, 2 * np.pi, segments, endpoint=False)
-    verts = []
-    for zi, ri in zip(zs, rs):
-        for t in theta:
-            x = ri * np.cos(t)
-            y = ri * np.sin(t)
-            verts.append([x, y, zi])
-    verts = np.array(verts)
-    faces = []
-    for i in range(segments):
-        i0 = i
-        i1 = (i + 1) % segments
-        j0 = i + segments
-        j1 = ((i + 1) % segments) + segments
-        faces.append([i0, i1, j1])
-        faces.append([i0, j1, j0])
-    mesh = tm.Trimesh(vertices=verts, faces=np.array(faces), process=True)
+    ring = np.stack([np.cos(theta), np.sin(theta)], axis=1)
+    bottom = np.column_stack([ring * r_bottom_mm, np.zeros(segments)])
+    top = np.column_stack([ring * r_top_mm, np.full(segments, height_mm)])
+    verts = np.vstack([bottom, top])
+    i0 = np.arange(segments)
+    i1 = (i0 + 1) % segments
+    j0 = i0 + segments
+    j1 = i1 + segments
+    # Interleave the two triangles of each side quad to keep the original face order
+    faces = np.stack([np.column_stack([i0, i1, j1]), np.column_stack([i0, j1, j0])], axis=1).reshape(-1, 3)
+    mesh = tm.Trimesh(vertices=verts, faces=faces, process=True)
     mesh.fix_normals()
     return mesh
 
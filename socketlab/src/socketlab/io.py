@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import hashlib
 import json
+import mmap
 import os
 from typing import Tuple
 
@@ -14,29 +15,35 @@ MM_BOUNDS = (30.0, 1000.0)  # expected bbox range in mm
 
 
 def sha256_file(path: str) -> str:
-    h = hashlib.sha256()
     with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            h.update(chunk)
-    return h.hexdigest()
-
-
-def load_mesh(path: str) -> tm.Trimesh:
+        if hasattr(hashlib, "file_digest"):  # Python 3.11+: hashed in C without Python-level reads
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.sha256().hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return hashlib.sha256(mm).hexdigest()
+
+
+def load_mesh(path: str, *, repair: bool = False) -> tm.Trimesh:
+    """Load a mesh, dropping duplicate/degenerate faces. `repair=True` additionally prunes
+    unreferenced vertices and fills holes (with a normals fix) on non-watertight input.
+    """
     mesh = tm.load(path, force="mesh")
     if isinstance(mesh, tm.Scene):
-        mesh = tm.util.concatenate(tuple(m for m in mesh.dump().geometry.values()))
-    mesh.remove_unreferenced_vertices()
-    mesh.remove_duplicate_faces()
-    mesh.remove_degenerate_faces()
+        mesh = mesh.dump(concatenate=True)
+    # validate=True drops duplicate/degenerate faces and makes normals coherent outward
     mesh.process(validate=True)
-    # Ensure normals are coherent outward
+    # Keep the shift undone by rezero so callers can map results back to file coordinates
+    mesh.metadata["rezero_offset"] = mesh.bounds[0].tolist()
     mesh.rezero()
-    if not mesh.is_watertight:
-        try:
-            tmrepair.fill_holes(mesh)
-        except Exception:
-            pass
-    mesh.fix_normals()
+    if repair:
+        mesh.remove_unreferenced_vertices()
+        if not mesh.is_watertight:
+            try:
+                tmrepair.fill_holes(mesh)
+            except Exception:
+                pass
+            mesh.fix_normals()
     return mesh
 
 
@@ -48,9 +55,35 @@ def check_units_mm(mesh: tm.Trimesh) -> Tuple[bool, Tuple[float, float, float]]:
     return ok, (dx, dy, dz)
 
 
+_STL_RECORD = np.dtype([
+    ("normal", "<f4", (3,)),
+    ("v1", "<f4", (3,)),
+    ("v2", "<f4", (3,)),
+    ("v3", "<f4", (3,)),
+    ("attr", "<u2"),
+])
+
+
+def _write_binary_stl(mesh: tm.Trimesh, path: str) -> None:
+    """Write a binary STL: 80-byte header, uint32 count, then one packed 50-byte record per face."""
+    tris = mesh.triangles
+    rec = np.zeros(len(mesh.faces), dtype=_STL_RECORD)
+    rec["normal"] = mesh.face_normals
+    rec["v1"] = tris[:, 0]
+    rec["v2"] = tris[:, 1]
+    rec["v3"] = tris[:, 2]
+    with open(path, "wb") as f:
+        f.write(b"\0" * 80)
+        f.write(np.uint32(len(rec)).tobytes())
+        f.write(rec.tobytes())
+
+
 def save_mesh(mesh: tm.Trimesh, path: str) -> None:
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    mesh.export(path)
+    if path.lower().endswith(".stl"):
+        _write_binary_stl(mesh, path)
+    else:
+        mesh.export(path)
 
 
 def save_json(data, path: str) -> None:
@@ -64,5 +97,4 @@ def apply_scale(mesh: tm.Trimesh, scale: float) -> tm.Trimesh:
         mesh = mesh.copy()
         mesh.apply_scale(scale)
         mesh.process(validate=True)
-        mesh.fix_normals()
     return mesh
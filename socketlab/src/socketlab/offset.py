@@ -1,14 +1,17 @@
 from __future__ import annotations
 
+import functools
 from typing import Optional, Tuple, List, Dict, Any
 
 import numpy as np
 import trimesh as tm
 from skimage.morphology import ball
 from skimage import measure
-from scipy.ndimage import binary_dilation, binary_erosion
+from scipy.ndimage import binary_erosion
 from scipy.ndimage import distance_transform_edt
 
+from .offset_voxelize import band_distance, voxelize_triangles
+
 
 def auto_voxel_mm(bbox_mm: Tuple[float, float, float]) -> float:
     # Aim for ~384 voxels along the long axis for better fidelity; clamp 0.3–1.0mm
@@ -19,38 +22,37 @@ def auto_voxel_mm(bbox_mm: Tuple[float, float, float]) -> float:
 def volumetric_offset_mesh(
     mesh: tm.Trimesh, offset_mm: float, voxel_mm: Optional[float] = None
 ) -> tm.Trimesh:
-    # Voxelization via Trimesh voxelized fill with pitch = voxel_mm
+    # Surface voxelization with pitch = voxel_mm (numba kernel, trimesh fallback)
     bbox = mesh.bounding_box.extents
     if voxel_mm is None:
         voxel_mm = auto_voxel_mm(tuple(map(float, bbox)))
 
     vox, grid, voxel_mm = _voxelize_surface(mesh, voxel_mm)
 
-    # Compute radius in voxels for the offset using a spherical structuring element
-    r_vox = max(1, int(round(abs(offset_mm) / voxel_mm)))
-    selem = ball(r_vox)
+    # Offset by at least one voxel so the result differs from the input
+    r_mm = max(voxel_mm, abs(offset_mm))
 
-    # For dilation (positive offset), we want to grow outward; for negative, erode
+    # Signed field (positive inside) whose zero level is the offset surface: grow outward
+    # for positive offsets, erode for negative
     if offset_mm >= 0:
-        grid2 = binary_dilation(grid, structure=selem)
+        dist = distance_transform_edt(~grid, sampling=voxel_mm)
+        np.subtract(r_mm, dist, out=dist)
     else:
-        grid2 = binary_erosion(grid, structure=selem)
+        dist = distance_transform_edt(grid, sampling=voxel_mm)
+        dist -= r_mm
+    # marching_cubes works in float32 and would otherwise copy a float64 field
+    sdf = dist.astype(np.float32)
+    del dist
 
     # Marching cubes to surface
-    grid_mc = _ensure_min_shape(grid2)
-    verts, faces, normals, _ = measure.marching_cubes(grid_mc.astype(np.uint8), level=0.5, spacing=(voxel_mm, voxel_mm, voxel_mm))
+    sdf = _ensure_min_shape(sdf, fill=-voxel_mm)
+    verts, faces = _marching_cubes_tiled(sdf, spacing=(voxel_mm, voxel_mm, voxel_mm))
 
     # marching_cubes gives coordinates in voxel space; map to world by adding transform translation
     origin = np.array(vox.transform[:3, 3])
     verts = verts + origin
 
-    out = tm.Trimesh(vertices=verts, faces=faces, process=True)
-    out.remove_degenerate_faces()
-    out.remove_duplicate_faces()
-    out.remove_unreferenced_vertices()
-    out.process(validate=True)
-    out.fix_normals()
-    return out
+    return _finalize(tm.Trimesh(vertices=verts, faces=faces, process=False))
 
 
 def make_shell_inner_outer(
@@ -59,47 +61,60 @@ def make_shell_inner_outer(
     wall_mm: float,
     voxel_mm: Optional[float] = None,
     marks: Optional[List[Dict[str, Any]]] = None,
-) -> Tuple[tm.Trimesh, tm.Trimesh, tm.Trimesh]:
-    """Return inner, outer, and solid shell (outer minus inner) meshes via volumetric banding."""
+    return_field: bool = False,
+):
+    """Return inner, outer, and solid shell (outer minus inner) meshes via volumetric banding.
+
+    With return_field=True a fourth item (sdf, origin, voxel_mm) is appended: the shell's
+    signed field as meshed, for `trim_field_with_plane` to cut without re-voxelizing.
+    """
     bbox = limb.bounding_box.extents
     if voxel_mm is None:
         voxel_mm = auto_voxel_mm(tuple(map(float, bbox)))
 
-    vox, grid, voxel_mm = _voxelize_surface(limb, voxel_mm)
+    # Pad to allow dilation to grow outward (band width plus a few voxels of margin)
+    pad_mm = abs(base_clearance_mm) + abs(wall_mm) + 3 * voxel_mm
+    grid_padded, origin, voxel_mm = _voxelize_into_padded(limb, voxel_mm, pad_mm)
 
-    r_clear = max(1, int(round(abs(base_clearance_mm) / voxel_mm)))
-    r_wall = max(1, int(round(abs(wall_mm) / voxel_mm)))
-    selem_c = ball(r_clear)
-    selem_w = ball(r_wall)
+    # Offsets are at least one voxel so the band never collapses
+    r_in = max(voxel_mm, abs(base_clearance_mm))
+    r_out = r_in + max(voxel_mm, abs(wall_mm))
 
-    # Pad to allow dilation to grow outward
-    pad_vox = r_clear + r_wall + 3
-    grid_padded = _pad_grid(grid, pad_vox)
-
-    inner_grid = _safe_dilation(grid_padded, r_clear)
-    outer_grid = _safe_dilation(inner_grid, r_wall)
+    # One distance field serves both offsets: dilating by the clearance and then
+    # by the wall is the same as thresholding the distance at their sum. Only the band
+    # (plus a voxel or two for marching cubes interpolation) needs exact distances.
+    edt_out = _band_edt(grid_padded, voxel_mm, r_out + 2 * voxel_mm)
+    inner_grid = _safe_dilation(grid_padded, r_in, voxel_mm, edt=edt_out)
+    outer_grid = _safe_dilation(grid_padded, r_out, voxel_mm, edt=edt_out)
 
     # Apply local mark adjustments on the shell band if provided
     if marks:
-        inner_grid, outer_grid = _apply_marks(inner_grid, outer_grid, voxel_mm, origin=np.array(vox.transform[:3, 3]) - pad_vox * voxel_mm, marks=marks)
+        inner_grid, outer_grid = _apply_marks(inner_grid, outer_grid, voxel_mm, origin=origin, marks=marks)
 
-    shell_grid = outer_grid & (~inner_grid)
-    if not shell_grid.any():
+    # Band logic on bit-packed grids (8 voxels per byte); only unpacked when a field is needed
+    shell_bits = _pack(outer_grid) & ~_pack(inner_grid)
+    if not shell_bits.any():
         # Approximate shell by boundary of outer
-        shell_grid = outer_grid & (~binary_erosion(outer_grid, structure=ball(1)))
+        shell_grid = outer_grid & (~binary_erosion(outer_grid, structure=_ball(1)))
+        sdf = _signed_distance(shell_grid, voxel_mm)
+    elif marks:
+        # Marks edit the occupancy directly, so derive the field from the final band
+        sdf = _signed_distance(_unpack(shell_bits, outer_grid.shape), voxel_mm)
+    else:
+        # Band distance straight from the shared EDT: positive between the two offsets
+        sdf = np.minimum(edt_out - r_in, r_out - edt_out)
 
-    origin = np.array(vox.transform[:3, 3]) - pad_vox * voxel_mm
     spacing = (voxel_mm, voxel_mm, voxel_mm)
     # Surfaces for inner and outer (for reference/outputs)
     # Shell is primary
-    vs, fs, ns, _ = measure.marching_cubes(_ensure_min_shape(shell_grid).astype(np.uint8), level=0.5, spacing=spacing)
+    vs, fs = _marching_cubes_tiled(_ensure_min_shape(sdf, fill=-voxel_mm), spacing=spacing)
     vs += origin
-    shell = tm.Trimesh(vertices=vs, faces=fs, process=True)
-    # For M0, mirror shell to inner/outer for export stability
+    shell = _finalize(tm.Trimesh(vertices=vs, faces=fs, process=False))
+    # For M0, mirror shell to inner/outer for export stability (copies are already clean)
     inner = shell.copy()
     outer = shell.copy()
-    for m in (inner, outer, shell):
-        m.remove_degenerate_faces(); m.remove_duplicate_faces(); m.remove_unreferenced_vertices(); m.process(validate=True); m.fix_normals()
+    if return_field:
+        return inner, outer, shell, (sdf, origin, voxel_mm)
     return inner, outer, shell
 
 
@@ -116,16 +131,110 @@ def trim_with_plane_volumetric(mesh: tm.Trimesh, voxel_mm: float, z_trim: float)
     mask = z_coords <= (z_trim + 0.5 * voxel_mm)
     grid[:, :, ~mask] = False
 
-    grid_mc = _ensure_min_shape(grid)
-    vs, fs, ns, _ = measure.marching_cubes(grid_mc.astype(np.uint8), level=0.5, spacing=spacing)
+    sdf = _ensure_min_shape(_signed_distance(grid, voxel_mm), fill=-voxel_mm)
+    vs, fs = _marching_cubes_tiled(sdf, spacing=spacing)
     vs += origin
-    out = tm.Trimesh(vertices=vs, faces=fs, process=True)
-    out.remove_degenerate_faces(); out.remove_duplicate_faces(); out.remove_unreferenced_vertices(); out.process(validate=True); out.fix_normals()
-    return out
+    return _finalize(tm.Trimesh(vertices=vs, faces=fs, process=False))
 
 
-def _ensure_min_shape(grid: np.ndarray, min_size: int = 2) -> np.ndarray:
-    """Pad grid with zeros to ensure each dimension is at least min_size."""
+def trim_field_with_plane(sdf: np.ndarray, origin: np.ndarray, voxel_mm: float, z_trim: float) -> tm.Trimesh:
+    """Trim a signed field (positive inside) above z_trim and remesh, without re-voxelizing.
+
+    Keeps the same voxel layers as `trim_with_plane_volumetric` and closes the cut with a
+    flat cap on the boundary between the last kept layer and the first dropped one.
+    """
+    nz = sdf.shape[2]
+    # Last kept layer: voxel centers at or below z_trim + half a voxel
+    k_last = int(np.floor((z_trim - origin[2]) / voxel_mm + 0.5))
+    if k_last < nz - 1:
+        k_last = max(k_last, 0)
+        # Crop to one layer past the cut and clamp both layers by the signed distance to the
+        # cap plane (+/- half a voxel); the rest of the field is unchanged
+        field = sdf[:, :, :k_last + 2].copy()
+        half = np.float32(0.5 * voxel_mm)
+        np.minimum(field[:, :, k_last], half, out=field[:, :, k_last])
+        np.minimum(field[:, :, k_last + 1], -half, out=field[:, :, k_last + 1])
+    else:
+        field = sdf
+    spacing = (voxel_mm, voxel_mm, voxel_mm)
+    vs, fs = _marching_cubes_tiled(_ensure_min_shape(field, fill=-voxel_mm), spacing=spacing)
+    vs += origin
+    return _finalize(tm.Trimesh(vertices=vs, faces=fs, process=False))
+
+
+def _marching_cubes_tiled(field: np.ndarray, spacing: Tuple[float, float, float], tile: int = 32, level: float = 0.0):
+    """Marching cubes over tile³ blocks of `field`; returns (verts, faces) like skimage.
+
+    Blocks share one layer of samples, so each cell is meshed exactly once and only the
+    vertices on block seams come out twice. Blocks with no level crossing are skipped, and
+    each block's working set stays cache-sized.
+    """
+    n0, n1, n2 = field.shape
+    verts, faces, seams = [], [], []
+    nv = 0
+    for i in range(0, n0 - 1, tile):
+        for j in range(0, n1 - 1, tile):
+            for k in range(0, n2 - 1, tile):
+                block = field[i:i + tile + 1, j:j + tile + 1, k:k + tile + 1]
+                if block.min() > level or block.max() < level:
+                    continue
+                try:
+                    v, f, _, _ = measure.marching_cubes(block, level=level)
+                except RuntimeError:
+                    # Crossing only touches the level without producing a surface
+                    continue
+                # Block-local coordinates on the first/last sample layer are exact in float32
+                seams.append(np.flatnonzero(((v == 0) | (v == tile)).any(axis=1)) + nv)
+                verts.append(v.astype(np.float64) + (i, j, k))
+                faces.append(f + nv)
+                nv += len(v)
+    if not verts:
+        raise ValueError("Surface level must be within volume data range.")
+    V = np.concatenate(verts)
+    F = np.concatenate(faces)
+
+    # Only vertices on a seam plane can be duplicated. skimage reports float32 block-local
+    # positions, so seam copies may differ in the last bits: recompute those on a cell edge
+    # (one fractional coordinate) in float64 from the two edge samples so copies match.
+    seam = np.concatenate(seams)
+    if seam.size == 0:
+        return V * np.asarray(spacing, dtype=np.float64), F
+    S = V[seam]
+    frac = S != np.round(S)
+    on_edge = np.flatnonzero(frac.sum(axis=1) == 1)
+    axis = frac[on_edge].argmax(axis=1)
+    lo = np.floor(S[on_edge]).astype(np.intp)
+    hi = lo.copy()
+    hi[np.arange(len(on_edge)), axis] += 1
+    f0 = field[lo[:, 0], lo[:, 1], lo[:, 2]].astype(np.float64)
+    f1 = field[hi[:, 0], hi[:, 1], hi[:, 2]].astype(np.float64)
+    ok = f1 != f0
+    S[on_edge[ok], axis[ok]] = lo[ok, axis[ok]] + (level - f0[ok]) / (f1[ok] - f0[ok])
+    V[seam] = S
+
+    # Merge seam copies, now bit-identical, on their exact coordinates (distinct vertices can sit
+    # far closer than any quantization step), then drop the duplicates
+    key = np.ascontiguousarray(S).view(np.dtype((np.void, S.dtype.itemsize * 3))).ravel()
+    _, first, inv = np.unique(key, return_index=True, return_inverse=True)
+    target = np.arange(len(V))
+    target[seam] = seam[first][inv.reshape(-1)]
+    keep = np.ones(len(V), dtype=bool)
+    keep[seam] = False
+    keep[seam[first]] = True
+    new_index = np.cumsum(keep) - 1
+    return V[keep] * np.asarray(spacing, dtype=np.float64), new_index[target][F]
+
+
+def _finalize(mesh: tm.Trimesh) -> tm.Trimesh:
+    """Clean a marching-cubes mesh once: process(validate=True) merges vertices, drops
+    duplicate/degenerate faces and fixes normals; unreferenced vertices are pruned after."""
+    mesh.process(validate=True)
+    mesh.remove_unreferenced_vertices()
+    return mesh
+
+
+def _ensure_min_shape(grid: np.ndarray, min_size: int = 2, fill=False) -> np.ndarray:
+    """Pad grid with `fill` (outside value) to ensure each dimension is at least min_size."""
     pad = []
     for d in range(3):
         size = grid.shape[d]
@@ -135,7 +244,7 @@ def _ensure_min_shape(grid: np.ndarray, min_size: int = 2) -> np.ndarray:
             need = min_size - size
             pad.append((0, need))
     if any(p[1] > 0 for p in pad):
-        return np.pad(grid, pad_width=tuple(pad), mode="constant", constant_values=False)
+        return np.pad(grid, pad_width=tuple(pad), mode="constant", constant_values=fill)
     return grid
 
 
@@ -144,32 +253,91 @@ def _voxelize_surface(mesh: tm.Trimesh, voxel_mm: float, retries: int = 3):
     v = voxel_mm
     last_vox = None
     for _ in range(retries + 1):
-        vox = mesh.voxelized(pitch=v)
-        grid = vox.matrix.astype(bool)
+        vox = _voxelize_mesh(mesh, v)
+        grid = np.asarray(vox.matrix, dtype=bool)
         if grid.any() and not grid.all() and min(grid.shape) >= 2:
             return vox, grid, v
         last_vox = vox
         v = max(v * 0.5, 0.25)
     if last_vox is None:
-        last_vox = mesh.voxelized(pitch=v)
-    grid = last_vox.matrix.astype(bool)
+        last_vox = _voxelize_mesh(mesh, v)
+    grid = np.asarray(last_vox.matrix, dtype=bool)
     grid = _ensure_min_shape(grid)
     return last_vox, grid, v
 
 
-def _pad_grid(grid: np.ndarray, pad: int) -> np.ndarray:
-    if pad <= 0:
-        return grid
-    return np.pad(grid, pad_width=((pad, pad), (pad, pad), (pad, pad)), mode="constant", constant_values=False)
+def _voxelize_mesh(mesh: tm.Trimesh, pitch: float):
+    """Surface voxelization via the numba SAT kernel, falling back to trimesh if unavailable or failing."""
+    try:
+        vox = voxelize_triangles(mesh.vertices, mesh.faces, pitch)
+    except Exception:
+        vox = None
+    if vox is None:
+        vox = mesh.voxelized(pitch=pitch)
+    return vox
 
 
-def _safe_dilation(grid: np.ndarray, r: int) -> np.ndarray:
-    rr = max(1, int(r))
-    while rr >= 1:
-        g = binary_dilation(grid, structure=ball(rr))
+def _voxelize_into_padded(mesh: tm.Trimesh, voxel_mm: float, pad_mm: float):
+    """Voxelize like `_voxelize_surface`, writing occupancy into a zero buffer padded by at
+    least pad_mm on every side (no separate np.pad copy). Returns (grid, origin, voxel_mm).
+    """
+    vox, grid, voxel_mm = _voxelize_surface(mesh, voxel_mm)
+    p = max(0, int(np.ceil(pad_mm / voxel_mm)))
+    nx, ny, nz = grid.shape
+    out = np.zeros((nx + 2 * p, ny + 2 * p, nz + 2 * p), dtype=bool)
+    out[p:p + nx, p:p + ny, p:p + nz] = grid
+    origin = np.array(vox.transform[:3, 3]) - p * voxel_mm
+    return out, origin, voxel_mm
+
+
+@functools.lru_cache(maxsize=32)
+def _ball(r: int) -> np.ndarray:
+    """Cached, read-only skimage ball(r) structuring element."""
+    b = ball(int(r))
+    b.setflags(write=False)
+    return b
+
+
+def _pack(grid: np.ndarray) -> np.ndarray:
+    """Pack a boolean grid into bits along the last axis."""
+    return np.packbits(grid, axis=-1, bitorder="little")
+
+
+def _unpack(bits: np.ndarray, shape: Tuple[int, int, int]) -> np.ndarray:
+    """Inverse of `_pack` for a grid of the given shape."""
+    return np.unpackbits(bits, axis=-1, count=shape[-1], bitorder="little").view(bool)
+
+
+def _band_edt(grid: np.ndarray, voxel_mm: float, max_mm: float) -> np.ndarray:
+    """Distance to the nearest set voxel, exact within max_mm (numba narrow band); full scipy EDT as fallback."""
+    try:
+        dist = band_distance(grid, voxel_mm, max_mm)
+    except Exception:
+        dist = None
+    if dist is None:
+        dist = distance_transform_edt(~grid, sampling=voxel_mm).astype(np.float32)
+    return dist
+
+
+def _signed_distance(grid: np.ndarray, voxel_mm: float) -> np.ndarray:
+    """Signed distance in mm (float32), positive inside; its zero level matches the 0.5 iso of the binary grid."""
+    sd = distance_transform_edt(grid, sampling=voxel_mm)
+    sd -= distance_transform_edt(~grid, sampling=voxel_mm)
+    return sd.astype(np.float32)
+
+
+def _safe_dilation(grid: np.ndarray, r_mm: float, voxel_mm: float, edt: Optional[np.ndarray] = None) -> np.ndarray:
+    """Dilate by r_mm, shrinking the radius a voxel at a time if the result is empty or full.
+    Pass a precomputed `distance_transform_edt(~grid)` as `edt` to reuse it across radii.
+    """
+    if edt is None:
+        edt = distance_transform_edt(~grid, sampling=voxel_mm)
+    rr = max(voxel_mm, float(r_mm))
+    while rr >= voxel_mm:
+        g = edt <= rr
         if g.any() and not g.all():
             return g
-        rr -= 1
+        rr -= voxel_mm
     return grid.copy()
 
 
@@ -200,39 +368,48 @@ def _apply_marks(inner_grid: np.ndarray, outer_grid: np.ndarray, voxel_mm: float
         z0, z1 = max(0, center_vox[2]-r_vox), min(grid_shape[2]-1, center_vox[2]+r_vox)
         if x0>=x1 or y0>=y1 or z0>=z1:
             continue
-        # Create local boolean cube
-        lx = np.arange(x0, x1+1)
-        ly = np.arange(y0, y1+1)
-        lz = np.arange(z0, z1+1)
-        gx, gy, gz = np.meshgrid(lx, ly, lz, indexing='ij')
-        # World distance from sphere center for each voxel center
-        px = origin[0] + gx * voxel_mm
-        py = origin[1] + gy * voxel_mm
-        pz = origin[2] + gz * voxel_mm
-        dist = np.sqrt((px - cx)**2 + (py - cy)**2 + (pz - cz)**2)
-        sphere = dist <= radius_mm
-
+        # Squared world distance from the sphere center is separable per axis, so build
+        # three 1D terms and broadcast them instead of a full meshgrid of coordinates
+        dx2 = ((origin[0] + np.arange(x0, x1+1) * voxel_mm - cx) ** 2).astype(np.float32)
+        dy2 = ((origin[1] + np.arange(y0, y1+1) * voxel_mm - cy) ** 2).astype(np.float32)
+        dz2 = ((origin[2] + np.arange(z0, z1+1) * voxel_mm - cz) ** 2).astype(np.float32)
+        sphere = (dx2[:, None, None] + dy2[None, :, None] + dz2[None, None, :]) <= radius_mm * radius_mm
+
+        # Basic slices are views, so writes through them land in the full grids
+        box = (slice(x0, x1+1), slice(y0, y1+1), slice(z0, z1+1))
+        local = inner_grid[box]
+        outer_local = outer_grid[box]
         if mtype == 'trim':
             # Zero out both inner and outer where sphere applies
-            inner_grid[x0:x1+1, y0:y1+1, z0:z1+1][sphere] = False
-            outer_grid[x0:x1+1, y0:y1+1, z0:z1+1][sphere] = False
+            local[sphere] = False
+            outer_local[sphere] = False
+            continue
+        if mtype not in ('pad', 'relief'):
             continue
         # For pad/relief, adjust inner surface position locally by amount_mm
         amt_vox = max(1, int(np.round(abs(amount_mm) / voxel_mm)))
-        local = inner_grid[x0:x1+1, y0:y1+1, z0:z1+1]
+        # Dilation/erosion by ball(amt_vox) is a threshold on the distance to the nearest
+        # set/unset inner voxel; one narrow-band EDT costs the same for any amount. It runs
+        # on the box grown by the reach so voxels just outside the box still count.
+        reach = amt_vox + 1
+        ex = (
+            slice(max(0, x0 - reach), min(grid_shape[0], x1 + 1 + reach)),
+            slice(max(0, y0 - reach), min(grid_shape[1], y1 + 1 + reach)),
+            slice(max(0, z0 - reach), min(grid_shape[2], z1 + 1 + reach)),
+        )
+        # ball(amt_vox) includes its rim; the slack is far below the gap to the next distance
+        r_mm = (amt_vox + 1e-3) * voxel_mm
+        src = inner_grid[ex] if mtype == 'pad' else ~inner_grid[ex]
+        dist = _band_edt(src, voxel_mm, r_mm + voxel_mm)[
+            x0 - ex[0].start:x1 + 1 - ex[0].start,
+            y0 - ex[1].start:y1 + 1 - ex[1].start,
+            z0 - ex[2].start:z1 + 1 - ex[2].start,
+        ]
         if mtype == 'pad':
-            # Grow inner outward within the spherical region
-            grown = binary_dilation(local, structure=ball(amt_vox))
-            # Only apply inside the sphere mask to avoid global growth
-            local[sphere] = grown[sphere]
-        elif mtype == 'relief':
-            er = binary_erosion(local, structure=ball(amt_vox))
-            local[sphere] = er[sphere]
-        inner_grid[x0:x1+1, y0:y1+1, z0:z1+1] = local
+            # Grow inner outward within the spherical region only
+            local[sphere] = (dist <= r_mm)[sphere]
+        else:
+            local[sphere] = (dist > r_mm)[sphere]
         # Ensure outer contains inner plus wall; grow outer if needed locally
-        outer_local = outer_grid[x0:x1+1, y0:y1+1, z0:z1+1]
-        need = inner_grid[x0:x1+1, y0:y1+1, z0:z1+1] & (~outer_local)
-        if need.any():
-            outer_local = outer_local | need
-        outer_grid[x0:x1+1, y0:y1+1, z0:z1+1] = outer_local
+        outer_local |= local
     return inner_grid, outer_grid
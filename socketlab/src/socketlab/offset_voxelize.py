@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+from collections import namedtuple
+from typing import Optional, Tuple
+
+import numpy as np
+
+try:
+    import numba
+except Exception:  # pragma: no cover
+    numba = None
+
+
+# Minimal stand-in for trimesh's VoxelGrid: callers only use .matrix and .transform
+DenseVoxels = namedtuple("DenseVoxels", ["matrix", "transform"])
+
+
+def voxelize_triangles(vertices: np.ndarray, faces: np.ndarray, pitch: float) -> Optional[DenseVoxels]:
+    """Surface-voxelize a triangle mesh with the numba SAT kernel.
+
+    Voxel centers sit on multiples of `pitch` (same lattice as trimesh's voxelizer), and
+    a voxel is set when its cube overlaps any triangle. Returns None if numba is missing.
+    """
+    if numba is None:
+        return None
+    V = np.ascontiguousarray(vertices, dtype=np.float64)
+    F = np.ascontiguousarray(faces, dtype=np.int64)
+    if V.shape[0] == 0 or F.shape[0] == 0:
+        return None
+    lo = np.round(V.min(axis=0) / pitch).astype(np.int64)
+    hi = np.round(V.max(axis=0) / pitch).astype(np.int64)
+    origin = lo * float(pitch)
+    shape = tuple(int(n) for n in (hi - lo + 1))
+    grid = _voxelize_schwarz_seidel(V, F, float(pitch), origin, shape)
+    transform = np.eye(4)
+    transform[:3, :3] *= pitch
+    transform[:3, 3] = origin
+    return DenseVoxels(matrix=grid.view(bool), transform=transform)
+
+
+def _voxelize_schwarz_seidel(V: np.ndarray, F: np.ndarray, pitch: float, origin: np.ndarray, shape: Tuple[int, int, int]) -> np.ndarray:
+    """Conservative triangle/voxel overlap voxelization (Schwarz & Seidel 2010).
+
+    Parallel over triangles; each triangle tests the voxels of its bounding box with the
+    13-axis separating axis test. Every hit stores the same value, so threads can write
+    to the shared grid without atomics or per-thread buffers.
+    """
+    out = np.zeros(shape, dtype=np.uint8)
+    _sat_kernel(V, F, pitch, np.asarray(origin, dtype=np.float64), out)
+    return out
+
+
+def band_distance(grid: np.ndarray, voxel_mm: float, max_mm: float) -> Optional[np.ndarray]:
+    """Narrow-band Euclidean distance (mm, float32) from each voxel to the nearest set voxel.
+
+    Exact up to max_mm; voxels farther away get some value above max_mm, which is all the
+    offset thresholds need. Work and memory stay at a few bytes per voxel instead of
+    scipy's full feature transform. Returns None if numba is missing.
+    """
+    if numba is None:
+        return None
+    h = int(np.ceil(max_mm / voxel_mm)) + 1
+    d2 = np.empty(grid.shape, dtype=np.int32)
+    _band_sq_edt(np.ascontiguousarray(grid, dtype=bool).view(np.uint8), h, d2)
+    out = d2.astype(np.float32)
+    np.sqrt(out, out=out)
+    out *= np.float32(voxel_mm)
+    return out
+
+
+if numba is not None:
+
+    @numba.njit(cache=True, inline="always")
+    def _axis_separates(p0, p1, p2, r):
+        mn = min(p0, p1, p2)
+        mx = max(p0, p1, p2)
+        return mn > r or mx < -r
+
+    @numba.njit(cache=True)
+    def _tri_box_overlap(ax, ay, az, bx, by, bz, cx, cy, cz, h):
+        # Triangle vertices are relative to the box center; box half-size is h
+        # AABB axes
+        if _axis_separates(ax, bx, cx, h) or _axis_separates(ay, by, cy, h) or _axis_separates(az, bz, cz, h):
+            return False
+        e0x, e0y, e0z = bx - ax, by - ay, bz - az
+        e1x, e1y, e1z = cx - bx, cy - by, cz - bz
+        e2x, e2y, e2z = ax - cx, ay - cy, az - cz
+        # Triangle plane
+        nx = e0y * e1z - e0z * e1y
+        ny = e0z * e1x - e0x * e1z
+        nz = e0x * e1y - e0y * e1x
+        if abs(nx * ax + ny * ay + nz * az) > h * (abs(nx) + abs(ny) + abs(nz)):
+            return False
+        # Cross products of the box axes with the three triangle edges
+        for ex, ey, ez in ((e0x, e0y, e0z), (e1x, e1y, e1z), (e2x, e2y, e2z)):
+            # x × e = (0, -ez, ey)
+            if _axis_separates(-ez * ay + ey * az, -ez * by + ey * bz, -ez * cy + ey * cz, h * (abs(ez) + abs(ey))):
+                return False
+            # y × e = (ez, 0, -ex)
+            if _axis_separates(ez * ax - ex * az, ez * bx - ex * bz, ez * cx - ex * cz, h * (abs(ez) + abs(ex))):
+                return False
+            # z × e = (-ey, ex, 0)
+            if _axis_separates(-ey * ax + ex * ay, -ey * bx + ex * by, -ey * cx + ex * cy, h * (abs(ey) + abs(ex))):
+                return False
+        return True
+
+    @numba.njit(parallel=True, cache=True)
+    def _sat_kernel(V, F, pitch, origin, out):
+        h = 0.5 * pitch
+        n0, n1, n2 = out.shape
+        for t in numba.prange(F.shape[0]):
+            a = V[F[t, 0]]
+            b = V[F[t, 1]]
+            c = V[F[t, 2]]
+            # Voxel index range covered by the triangle's bounding box
+            i0 = max(0, int(np.ceil((min(a[0], b[0], c[0]) - origin[0]) / pitch - 0.5)))
+            i1 = min(n0 - 1, int(np.floor((max(a[0], b[0], c[0]) - origin[0]) / pitch + 0.5)))
+            j0 = max(0, int(np.ceil((min(a[1], b[1], c[1]) - origin[1]) / pitch - 0.5)))
+            j1 = min(n1 - 1, int(np.floor((max(a[1], b[1], c[1]) - origin[1]) / pitch + 0.5)))
+            k0 = max(0, int(np.ceil((min(a[2], b[2], c[2]) - origin[2]) / pitch - 0.5)))
+            k1 = min(n2 - 1, int(np.floor((max(a[2], b[2], c[2]) - origin[2]) / pitch + 0.5)))
+            for i in range(i0, i1 + 1):
+                px = origin[0] + i * pitch
+                for j in range(j0, j1 + 1):
+                    py = origin[1] + j * pitch
+                    for k in range(k0, k1 + 1):
+                        if out[i, j, k]:
+                            continue
+                        pz = origin[2] + k * pitch
+                        if _tri_box_overlap(
+                            a[0] - px, a[1] - py, a[2] - pz,
+                            b[0] - px, b[1] - py, b[2] - pz,
+                            c[0] - px, c[1] - py, c[2] - pz,
+                            h,
+                        ):
+                            out[i, j, k] = 1
+
+    @numba.njit(cache=True)
+    def _envelope_1d(f, n, cap, inf, v, z, out):
+        # Felzenszwalb-Huttenlocher lower envelope of parabolas over the finite samples of f;
+        # results above cap are clamped to inf. Leaves out untouched if f has no finite sample.
+        kk = -1
+        for q in range(n):
+            if f[q] >= inf:
+                continue
+            if kk < 0:
+                kk = 0
+                v[0] = q
+                z[0] = -np.inf
+                z[1] = np.inf
+                continue
+            s = ((f[q] + q * q) - (f[v[kk]] + v[kk] * v[kk])) / (2.0 * (q - v[kk]))
+            while s <= z[kk]:
+                kk -= 1
+                s = ((f[q] + q * q) - (f[v[kk]] + v[kk] * v[kk])) / (2.0 * (q - v[kk]))
+            kk += 1
+            v[kk] = q
+            z[kk] = s
+            z[kk + 1] = np.inf
+        if kk < 0:
+            return
+        j = 0
+        for q in range(n):
+            while z[j + 1] < q:
+                j += 1
+            val = (q - v[j]) * (q - v[j]) + f[v[j]]
+            out[q] = val if val <= cap else inf
+
+    @numba.njit(parallel=True, cache=True)
+    def _band_sq_edt(grid, h, out):
+        # Separable squared EDT in voxel units, truncated at h: any partial sum above h^2
+        # can only grow, so it is dropped to the inf sentinel and never enters an envelope.
+        n0, n1, n2 = grid.shape
+        cap = h * h
+        inf = cap + 1
+        # Pass 1: 1D distance along the contiguous axis (forward and backward sweeps)
+        for i in numba.prange(n0):
+            for j in range(n1):
+                d = h + 1
+                for k in range(n2):
+                    if grid[i, j, k]:
+                        d = 0
+                    elif d <= h:
+                        d += 1
+                    out[i, j, k] = d * d if d <= h else inf
+                d = h + 1
+                for k in range(n2 - 1, -1, -1):
+                    if grid[i, j, k]:
+                        d = 0
+                    elif d <= h:
+                        d += 1
+                    if d <= h and d * d < out[i, j, k]:
+                        out[i, j, k] = d * d
+        # Pass 2: envelope along axis 1
+        for i in numba.prange(n0):
+            f = np.empty(n1, dtype=np.int64)
+            res = np.empty(n1, dtype=np.int64)
+            v = np.empty(n1, dtype=np.int64)
+            z = np.empty(n1 + 1, dtype=np.float64)
+            for k in range(n2):
+                for j in range(n1):
+                    f[j] = out[i, j, k]
+                    res[j] = f[j]
+                _envelope_1d(f, n1, cap, inf, v, z, res)
+                for j in range(n1):
+                    out[i, j, k] = res[j]
+        # Pass 3: envelope along axis 0
+        for j in numba.prange(n1):
+            f = np.empty(n0, dtype=np.int64)
+            res = np.empty(n0, dtype=np.int64)
+            v = np.empty(n0, dtype=np.int64)
+            z = np.empty(n0 + 1, dtype=np.float64)
+            for k in range(n2):
+                for i in range(n0):
+                    f[i] = out[i, j, k]
+                    res[i] = f[i]
+                _envelope_1d(f, n0, cap, inf, v, z, res)
+                for i in range(n0):
+                    out[i, j, k] = res[i]
+
+else:  # pragma: no cover
+
+    def _sat_kernel(V, F, pitch, origin, out):
+        raise RuntimeError("numba not available")
+
+    def _band_sq_edt(grid, h, out):
+        raise RuntimeError("numba not available")
@@ -50,17 +50,17 @@ def normalize_pose(vertices: np.ndarray, faces: np.ndarray, dz_mm: float = 10.0)
         T = np.eye(4)
         return V.copy(), T
     dz = max(dz_mm, 1.0)
-    zs = np.arange(zmin, zmax + 0.5 * dz, dz)
-    cents = []
-    for z0 in zs:
-        z1 = z0 + dz
-        slab = V1[(V1[:, 2] >= z0) & (V1[:, 2] < z1)]
-        if slab.shape[0] >= 50:
-            cents.append(slab[:, :2].mean(axis=0))
-    if len(cents) == 0:
+    nbins = len(np.arange(zmin, zmax + 0.5 * dz, dz))
+    # One pass: bin every vertex by slab, then per-slab XY sums and counts
+    bin_idx = np.clip(((V1[:, 2] - zmin) / dz).astype(np.int64), 0, nbins - 1)
+    counts = np.bincount(bin_idx, minlength=nbins)
+    sx = np.bincount(bin_idx, weights=V1[:, 0], minlength=nbins)
+    sy = np.bincount(bin_idx, weights=V1[:, 1], minlength=nbins)
+    keep = counts >= 50
+    if not keep.any():
         xy_med = V1[:, :2].mean(axis=0)
     else:
-        cents = np.array(cents)
+        cents = np.column_stack([sx[keep] / counts[keep], sy[keep] / counts[keep]])
         xy_med = np.median(cents, axis=0)
     # recenter XY; set min Z to 0
     V2 = V1.copy()
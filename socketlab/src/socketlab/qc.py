@@ -1,69 +1,146 @@
 from __future__ import annotations
 
-import csv
-from typing import Iterable, List, Dict
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Dict, Optional
 
 import numpy as np
+import shapely
 import shapely.geometry as sgeom
 import shapely.ops as sops
 import trimesh as tm
 
+try:
+    import numba
+except Exception:  # pragma: no cover
+    numba = None
 
-def _section_polygons_xy(mesh: tm.Trimesh, z: float):
-    section = mesh.section(plane_origin=[0, 0, z], plane_normal=[0, 0, 1])
-    if section is None:
-        return []
-    planar, _ = section.to_planar()
-    return planar.polygons_full
 
+def _section_polygons_xy(mesh: tm.Trimesh, z: float, faces: Optional[np.ndarray] = None):
+    """Polygons (with holes) of the mesh cross-section at height z.
 
-def compute_sections(mesh: tm.Trimesh, z_values: Iterable[float]) -> List[Dict]:
-    rows: List[Dict] = []
-    for z in z_values:
-        polys = _section_polygons_xy(mesh, z)
-        if not polys:
+    `faces` optionally restricts the plane test to candidate face indices. Segments are
+    snapped to 1e-6 mm so shared edge crossings join, merged into closed rings, and the
+    rings are nested even-odd into polygons.
+    """
+    if faces is not None and len(faces) == 0:
+        return []
+    lines = tm.intersections.mesh_plane(mesh, plane_normal=[0, 0, 1], plane_origin=[0, 0, z], local_faces=faces)
+    if len(lines) == 0:
+        return []
+    segs = np.round(np.asarray(lines)[:, :, :2], 6)
+    merged = shapely.line_merge(shapely.multilinestrings(shapely.linestrings(segs)))
+    parts = getattr(merged, 'geoms', [merged])
+    rings = [sgeom.Polygon(ls.coords) for ls in parts if ls.is_ring and len(ls.coords) >= 4]
+    rings = [r for r in rings if r.area > 0.0]
+    if not rings:
+        return []
+    # Nest rings: a ring's depth is the number of larger rings containing it; even depths
+    # are shells and odd depths are holes of their immediate parent.
+    rings.sort(key=lambda r: r.area, reverse=True)
+    parent = [-1] * len(rings)
+    depth = [0] * len(rings)
+    for i, r in enumerate(rings):
+        pt = r.representative_point()
+        for j in range(i - 1, -1, -1):
+            if rings[j].contains(pt):
+                parent[i] = j
+                depth[i] = depth[j] + 1
+                break
+    polys = []
+    for i, r in enumerate(rings):
+        if depth[i] % 2:
             continue
-        loops = []
-        for poly in polys:
-            try:
-                ext = np.asarray(poly.exterior.coords)
-                if ext.shape[0] >= 3:
-                    holes = []
-                    for hole in getattr(poly, 'interiors', []):
-                        hcoords = np.asarray(hole.coords)
-                        if hcoords.shape[0] >= 3:
-                            holes.append(hcoords)
-                    loops.append(sgeom.Polygon(ext, holes))
-            except Exception:
-                continue
-        if not loops:
+        holes = [rings[k].exterior.coords for k in range(len(rings)) if parent[k] == i]
+        polys.append(sgeom.Polygon(r.exterior.coords, holes))
+    return polys
+
+
+def _faces_by_zmin(mesh: tm.Trimesh):
+    """Face indices sorted by min Z, with the sorted min Z and per-face max Z for slab queries."""
+    tri_z = mesh.vertices[mesh.faces][:, :, 2]
+    zmin = tri_z.min(axis=1)
+    order = np.argsort(zmin, kind="stable")
+    return order, zmin[order], tri_z.max(axis=1)
+
+
+def _loops_overlap(loops: List[sgeom.Polygon]) -> bool:
+    """True if any two loops intersect (bbox prefilter via STRtree, then exact predicate)."""
+    if len(loops) < 2:
+        return False
+    left, right = shapely.STRtree(loops).query(loops, predicate="intersects")
+    return bool(np.any(left != right))
+
+
+def _one_section(mesh: tm.Trimesh, z: float, faces: Optional[np.ndarray] = None) -> Optional[Dict]:
+    """Section metrics at height z, or None if the plane misses the mesh."""
+    polys = _section_polygons_xy(mesh, z, faces=faces)
+    if not polys:
+        return None
+    loops = []
+    for poly in polys:
+        try:
+            ext = np.asarray(poly.exterior.coords)
+            if ext.shape[0] >= 3:
+                holes = []
+                for hole in getattr(poly, 'interiors', []):
+                    hcoords = np.asarray(hole.coords)
+                    if hcoords.shape[0] >= 3:
+                        holes.append(hcoords)
+                loops.append(sgeom.Polygon(ext, holes))
+        except Exception:
             continue
-        # Union all loops into a MultiPolygon for robust metrics
+    if not loops:
+        return None
+    if _loops_overlap(loops):
+        # Union overlapping loops into a MultiPolygon for robust metrics
         geom = sops.unary_union(loops)
         if geom.is_empty:
-            continue
+            return None
         perimeter = float(geom.length)
         area = float(geom.area)
-        # Equivalent diameter from area
-        eq_diam = 2.0 * np.sqrt(area / np.pi)
-        rows.append({
-            "z_mm": float(z),
-            "perimeter_mm": perimeter,
-            "area_mm2": area,
-            "equivalent_diameter_mm": eq_diam,
-        })
-    return rows
+    else:
+        # Disjoint loops (the usual case): metrics simply add up, no GEOS union needed
+        perimeter = float(shapely.length(loops).sum())
+        area = float(shapely.area(loops).sum())
+        if area <= 0.0:
+            return None
+    # Equivalent diameter from area
+    eq_diam = 2.0 * np.sqrt(area / np.pi)
+    return {
+        "z_mm": float(z),
+        "perimeter_mm": perimeter,
+        "area_mm2": area,
+        "equivalent_diameter_mm": eq_diam,
+    }
+
+
+def compute_sections(mesh: tm.Trimesh, z_values: Iterable[float]) -> List[Dict]:
+    z_values = list(z_values)
+    # All planes share the +Z normal, so index faces by Z extent once and only test the
+    # faces that straddle each plane instead of re-walking the whole mesh per slice.
+    order, zmin_sorted, zmax = _faces_by_zmin(mesh)
+    jobs = []
+    for z in z_values:
+        below = order[:np.searchsorted(zmin_sorted, z, side="right")]
+        jobs.append((z, below[zmax[below] >= z]))
+    # Slices are independent and mostly spend their time in numpy/GEOS, so threads scale
+    if len(jobs) < 4:
+        rows = [_one_section(mesh, z, cand) for z, cand in jobs]
+    else:
+        # Same thread budget as the numba kernels (the server splits the cores between generations)
+        workers = numba.get_num_threads() if numba is not None else os.cpu_count()
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            rows = list(ex.map(lambda job: _one_section(mesh, *job), jobs))
+    return [r for r in rows if r is not None]
 
 
 def write_sections_csv(rows: List[Dict], path: str) -> None:
-    if not rows:
-        # Write header even if empty
-        rows = []
     fieldnames = ["z_mm", "perimeter_mm", "area_mm2", "equivalent_diameter_mm"]
-    import os
     os.makedirs(os.path.dirname(path), exist_ok=True)
+    # One buffered write instead of csv.DictWriter per row; same text and CRLF line endings.
+    # Values keep their full round-trip precision (np.savetxt would need a fixed format).
+    lines = [",".join(fieldnames)]
+    lines.extend(",".join(str(r[k]) for k in fieldnames) for r in rows)
     with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        w.writeheader()
-        for r in rows:
-            w.writerow(r)
+        f.write("\r\n".join(lines) + "\r\n")
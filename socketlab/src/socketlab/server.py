@@ -1,29 +1,119 @@
 from __future__ import annotations
 
+import asyncio
+import dataclasses
+import functools
+import gzip
+import hashlib
+import json
+import mimetypes
 import os
+import re
+import secrets
+import shutil
+import stat
+import sys
 import time
-import uuid
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
 
 import logging
 import traceback
+import aiofiles
+import aiofiles.os as aos
+import anyio
+import numpy as np
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
-
-from .types import MakeSocketOptions
+from starlette.datastructures import Headers
+from starlette.staticfiles import NotModifiedResponse
+
+try:
+    import brotli
+except Exception:  # pragma: no cover
+    brotli = None
+
+try:
+    import numba
+except Exception:  # pragma: no cover
+    numba = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+from . import __version__
+from .types import MakeSocketOptions, MakeSocketResult
 from .cli import make_socket
+from .io import sha256_file
 from .markings.detect_uv import detect_markings_from_glb
 
 
 # Prefer env DATA_ROOT; otherwise default to the repo root (three parents up from this file)
 _default_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, os.pardir))
 DATA_ROOT = os.environ.get("DATA_ROOT", _default_root)
-UPLOADS_DIR = os.path.join(DATA_ROOT, "uploads")
-OUT_DIR = os.path.join(DATA_ROOT, "out")
+_DATA_ROOT_P = Path(DATA_ROOT).resolve()
+_UPLOADS_P = _DATA_ROOT_P / "uploads"
+_OUT_P = _DATA_ROOT_P / "out"
+UPLOADS_DIR = str(_UPLOADS_P)
+# Stem of a content-addressed upload: uploads/<sha256[:16]><suffix>
+_UPLOAD_NAME_RE = re.compile(r"^[0-9a-f]{16}$")
+OUT_DIR = str(_OUT_P)
 os.makedirs(UPLOADS_DIR, exist_ok=True)
 os.makedirs(OUT_DIR, exist_ok=True)
+# Where a limb_path is looked up: under DATA_ROOT as given, then by file name in the sample folders
+_ROOT_DIR = str(_DATA_ROOT_P)
+_TESTMODEL_DIR = str(_DATA_ROOT_P / "testModel")
+_WEBVIEWER_DIR = str(_DATA_ROOT_P / "webviewer" / "public")
+# A limb_path is relative to DATA_ROOT even with a leading slash; only drive-qualified Windows
+# paths (C:\..., \\server\share\...) are absolute
+_ABS_RE = re.compile(r"^(?:[A-Za-z]:[\\/]|[\\/]{2}[^\\/])")
+
+# Uploads and static downloads move through chunks of this size: memory stays bounded for
+# large meshes without a thread hop per 64 KiB
+CHUNK_BYTES = 1 << 20
+
+# make_socket is long and CPU-bound; it runs off the event loop on one thread per process, as
+# the workqueue threading layer cannot launch parallel kernels from several threads at once.
+_GEN_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="make-socket")
+# Server-wide cap: a generation first takes one of GEN_CONCURRENCY slots, locked files shared by
+# every worker process, and its parallel kernels and section slicing get an even share of the
+# cores, so a burst neither oversubscribes the CPU nor multiplies peak memory per worker
+_GEN_CONCURRENCY = max(1, int(os.environ.get("GEN_CONCURRENCY", max(1, (os.cpu_count() or 1) // 2))))
+_GEN_THREADS = max(1, (os.cpu_count() or 1) // _GEN_CONCURRENCY)
+_GEN_SLOTS_P = _OUT_P / "_gen_slots"
+os.makedirs(_GEN_SLOTS_P, exist_ok=True)
+# numba tries tbb, then omp, then workqueue. Once tbb has run kernels from a thread other than
+# the main one, the process hangs at exit, so prefer omp and fall back to workqueue. Only
+# takes effect before the first parallel kernel launches, i.e. before the first generation.
+if numba is not None and "NUMBA_THREADING_LAYER_PRIORITY" not in os.environ:
+    numba.config.THREADING_LAYER_PRIORITY = ["omp", "workqueue", "tbb"]
+# Upload copies and output compression; kept apart so file work never queues behind a
+# generation
+_IO_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="socket-io")
+
+# Generation runs as a background task polled via /api/tasks/{id}. Task state is kept in small
+# JSON files rather than in memory, so whichever worker process receives a poll can answer it.
+_TASKS_P = _OUT_P / "_tasks"
+os.makedirs(_TASKS_P, exist_ok=True)
+_TASK_ID_RE = re.compile(r"^[0-9a-f]{16}$")
+# Accepted tasks always run to completion; load is shed before accepting one, once this many
+# are unfinished in the worker process (503 with Retry-After)
+_GEN_QUEUE_MAX = int(os.environ.get("GEN_QUEUE_MAX", "4"))
+_GEN_RETRY_AFTER_S = int(os.environ.get("GEN_RETRY_AFTER_S", "30"))
+# Unfinished tasks touch their state file every _TASK_HEARTBEAT_S; one left untouched for
+# _TASK_STALE_S belonged to a worker that died. Task files older than _TASK_TTL_S are pruned.
+_TASK_HEARTBEAT_S = 10.0
+_TASK_STALE_S = 60.0
+_TASK_TTL_S = 24 * 3600.0
+_PRUNE_AT = [0.0]
+# Strong references to running tasks; the event loop only keeps weak ones
+_RUNNING_TASKS: set = set()
 
 app = FastAPI(title="Akrolimb SocketLab API", version="0.1.0")
 logger = logging.getLogger("socketlab.api")
@@ -44,12 +134,332 @@ app.add_middleware(
 )
 
 
+_TS_CACHE = [0, ""]
+
+
+def _ts() -> str:
+    """Local "%Y%m%d-%H%M%S" timestamp for output names, formatted at most once per second."""
+    now = int(time.time())
+    if now != _TS_CACHE[0]:
+        _TS_CACHE[1] = time.strftime("%Y%m%d-%H%M%S", time.localtime(now))
+        _TS_CACHE[0] = now
+    return _TS_CACHE[1]
+
+
+def _copy_spooled(src, save_path: str) -> None:
+    """Copy an on-disk spooled upload to save_path in the kernel (os.sendfile) on Linux, chunked
+    otherwise; other platforms' sendfile only writes to sockets."""
+    src.flush()
+    with open(save_path, "wb") as dst:
+        if sys.platform.startswith("linux"):
+            try:
+                in_fd, out_fd = src.fileno(), dst.fileno()
+                size = os.fstat(in_fd).st_size
+                offset = 0
+                while offset < size:
+                    sent = os.sendfile(out_fd, in_fd, offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+                return
+            except OSError:
+                # Some filesystems refuse sendfile; start over with a plain copy
+                dst.seek(0)
+                dst.truncate()
+        src.seek(0)
+        shutil.copyfileobj(src, dst, CHUNK_BYTES)
+
+
+def _limb_path_abs(raw: str) -> str:
+    """Absolute path for a client-supplied limb_path (see _ABS_RE)."""
+    if os.name == "nt" and _ABS_RE.match(raw):
+        return raw
+    return os.path.join(_ROOT_DIR, raw.lstrip('/\\'))
+
+
+def _resolve_limb_path(raw: str) -> str:
+    """File for a client-supplied limb_path: as given under DATA_ROOT, else the same file name in
+    testModel/ or webviewer/public. One stat per candidate; the given path if none is a file."""
+    limb_abs = _limb_path_abs(raw)
+    if os.path.isfile(limb_abs):
+        return limb_abs
+    name = os.path.basename(raw)
+    for parent in (_TESTMODEL_DIR, _WEBVIEWER_DIR):
+        candidate = os.path.join(parent, name)
+        if os.path.isfile(candidate):
+            return candidate
+    return limb_abs
+
+
+def _to_static_url(p: str, _root: Path = _DATA_ROOT_P) -> str:
+    """URL under /static (DATA_ROOT is mounted there) for a path inside DATA_ROOT."""
+    return "/static/" + Path(p).relative_to(_root).as_posix()
+
+
+async def _save_upload(upload: UploadFile, save_path: str) -> None:
+    """Stream an upload to save_path without holding the whole body in memory."""
+    if getattr(upload.file, "_rolled", False):
+        # Large bodies were already spooled to a temp file by the multipart parser
+        await asyncio.get_running_loop().run_in_executor(_IO_POOL, _copy_spooled, upload.file, save_path)
+        return
+    async with aiofiles.open(save_path, "wb") as f:
+        while chunk := await upload.read(CHUNK_BYTES):
+            await f.write(chunk)
+
+
+def _precompress(paths: List[str]) -> None:
+    """Write .br/.gz siblings next to each output so /static can serve them to clients that
+    accept the encoding; compression then happens once instead of per download."""
+    for p in paths:
+        try:
+            _compress_file(p, ".gz")
+            if brotli is not None:
+                _compress_file(p, ".br")
+        except Exception as e:
+            logger.warning("precompress failed for %s: %s", p, e)
+
+
+def _compress_file(path: str, ext: str) -> None:
+    """Stream path into its gzip/brotli sibling CHUNK_BYTES at a time, so memory stays flat for
+    outputs of hundreds of MB. Written then renamed, so a sibling is never served half-written."""
+    tmp = path + ext + ".tmp"
+    with open(path, "rb") as src, open(tmp, "wb") as dst:
+        if ext == ".gz":
+            with gzip.GzipFile(filename="", mode="wb", compresslevel=6, fileobj=dst, mtime=0) as gz:
+                shutil.copyfileobj(src, gz, CHUNK_BYTES)
+        else:
+            comp = brotli.Compressor(quality=5)
+            while chunk := src.read(CHUNK_BYTES):
+                dst.write(comp.process(chunk))
+            dst.write(comp.finish())
+    os.replace(tmp, path + ext)
+
+
+def _write_task(tid: str, state: Dict[str, Any]) -> None:
+    """Persist a task's state (write then rename, so a poll never reads a partial file)."""
+    tmp = _TASKS_P / f"{tid}.json.tmp"
+    tmp.write_text(json.dumps(state), encoding="utf-8")
+    os.replace(tmp, _TASKS_P / f"{tid}.json")
+
+
+async def _heartbeat(tid: str) -> None:
+    path = _TASKS_P / f"{tid}.json"
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(_TASK_HEARTBEAT_S)
+        try:
+            await loop.run_in_executor(_IO_POOL, os.utime, path)
+        except OSError:
+            pass
+
+
+def _prune_tasks() -> None:
+    """Delete task state files, and generation temp dirs left by dead workers, older than _TASK_TTL_S."""
+    cutoff = time.time() - _TASK_TTL_S
+    with os.scandir(_TASKS_P) as it:
+        for entry in it:
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+    with os.scandir(_OUT_P) as it:
+        for entry in it:
+            try:
+                if entry.name.startswith(".") and ".tmp-" in entry.name and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except OSError:
+                pass
+
+
+async def _run_task(tid: str, dbg_id: str, job: Awaitable[Dict[str, Any]]) -> None:
+    """Await a generation job and record its outcome: the response payload, or the HTTP error
+    it would have returned when it ran inline."""
+    beat = asyncio.ensure_future(_heartbeat(tid))
+    try:
+        state = {"task_id": tid, "status": "done", **(await job)}
+    except HTTPException as e:
+        state = {"task_id": tid, "status": "error", "status_code": e.status_code, "detail": e.detail}
+    except Exception as e:
+        logger.exception("[%s] task failed: %s", dbg_id, e)
+        state = {"task_id": tid, "status": "error", "status_code": 500, "detail": f"Generation failed: {e}"}
+    finally:
+        beat.cancel()
+    await asyncio.get_running_loop().run_in_executor(_IO_POOL, _write_task, tid, state)
+
+
+@functools.lru_cache(maxsize=256)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    """SHA-256 of an input mesh (hashlib.file_digest, so OpenSSL's SHA extensions where available).
+    mtime_ns/size only key the cache, so an unchanged file is hashed once per process."""
+    return sha256_file(path)
+
+
+def _path_digest(path: str) -> str:
+    st = os.stat(path)
+    return _file_digest(path, st.st_mtime_ns, st.st_size)
+
+
+def _generator_salt() -> str:
+    """Package version plus a hash of the generator's sources (everything but this module), so a
+    release or a local change to the pipeline stops reusing outputs an older build cached."""
+    h = hashlib.sha256(__version__.encode("utf-8"))
+    pkg = Path(__file__).resolve().parent
+    for src in sorted(pkg.rglob("*.py")):
+        if src.name != "server.py":
+            h.update(src.relative_to(pkg).as_posix().encode("utf-8"))
+            h.update(src.read_bytes())
+    return h.hexdigest()
+
+
+_GEN_SALT = _generator_salt()
+
+
+def _output_key(opts: MakeSocketOptions, digest: str) -> str:
+    """Output directory name for opts: the input's content digest plus a hash of every option
+    that shapes the result and of the generator version, so identical requests map to the same directory."""
+    params = dataclasses.asdict(opts)
+    del params["limb_path"], params["outdir"]
+    params["_generator"] = _GEN_SALT
+    params_json = json.dumps(params, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return f"{digest[:16]}_{hashlib.sha256(params_json).hexdigest()[:8]}"
+
+
+def _store_upload(tmp_path: str, suffix: str) -> Tuple[str, str]:
+    """Move a saved upload to its content-addressed name (uploads/<sha256[:16]><suffix>), so
+    repeated uploads of one mesh share a file. Returns the final path and the digest."""
+    digest = _path_digest(tmp_path)
+    final = os.path.join(UPLOADS_DIR, f"{digest[:16]}{suffix}")
+    if os.path.exists(final):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, final)
+    return final, digest
+
+
+def _load_cached_result(outdir: str) -> Optional[MakeSocketResult]:
+    """Result of an earlier generation into outdir, if one completed there."""
+    try:
+        with open(os.path.join(outdir, "result.json"), "r", encoding="utf-8") as f:
+            fields = json.load(f)
+    except (OSError, ValueError):
+        return None
+    fields.pop("digests", None)
+    # Output paths are re-rooted at outdir, so the cache stays valid if DATA_ROOT moves
+    return MakeSocketResult(**{
+        k: os.path.join(outdir, os.path.basename(v)) if k.endswith("_path") else v for k, v in fields.items()
+    })
+
+
+@functools.lru_cache(maxsize=1024)
+def _output_digests(outdir: str) -> Dict[str, str]:
+    """SHA-256 of each file in outdir by name, as recorded in result.json at generation time
+    (empty for other directories). Output directories never change, so this is cached for good."""
+    try:
+        with open(os.path.join(outdir, "result.json"), "r", encoding="utf-8") as f:
+            return json.load(f).get("digests", {})
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+def _content_etag(full_path: str) -> Optional[str]:
+    """Content-hash ETag for generated outputs and their precompressed siblings, and for
+    content-addressed uploads (named after their digest). None where no digest is on record."""
+    parent, name = os.path.split(full_path)
+    if parent == UPLOADS_DIR:
+        stem = name.split(".", 1)[0]
+        return stem if _UPLOAD_NAME_RE.match(stem) else None
+    if os.path.dirname(parent) != OUT_DIR:
+        return None
+    suffix = ""
+    base, ext = os.path.splitext(name)
+    if ext in (".br", ".gz"):
+        # An encoding of the output: tag it after the original plus the coding
+        name, suffix = base, "-" + ext[1:]
+    digest = _output_digests(parent).get(name)
+    return digest[:32] + suffix if digest else None
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:  # pragma: no cover
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _acquire_gen_slot() -> int:
+    """Block until one of the _GEN_CONCURRENCY server-wide slots is free; returns the locked fd.
+    Closing it frees the slot, and so does the OS if the process dies."""
+    while True:
+        for i in range(_GEN_CONCURRENCY):
+            fd = os.open(str(_GEN_SLOTS_P / f"{i}.lock"), os.O_RDWR | os.O_CREAT)
+            if _try_lock(fd):
+                return fd
+            os.close(fd)
+        time.sleep(0.25)
+
+
+def _run_generation(tid: str, opts: MakeSocketOptions) -> MakeSocketResult:
+    """Generation thread entry point: wait for a server-wide slot, then mark the task running."""
+    slot = _acquire_gen_slot()
+    try:
+        _write_task(tid, {"task_id": tid, "status": "running"})
+        if numba is not None:
+            # Per-thread setting; also sizes qc.compute_sections' pool
+            numba.set_num_threads(min(_GEN_THREADS, numba.config.NUMBA_NUM_THREADS))
+        return _make_socket_cached(opts)
+    finally:
+        os.close(slot)
+
+
+def _make_socket_cached(opts: MakeSocketOptions) -> MakeSocketResult:
+    """make_socket, unless an identical request already filled opts.outdir; new results are
+    recorded in result.json and their compressed copies queued for /static."""
+    res = _load_cached_result(opts.outdir)
+    if res is not None:
+        return res
+    # Generate into a private temp dir and rename it into place once complete, so workers racing
+    # on the same request never write into or read from a half-filled outdir
+    final = opts.outdir
+    tmpdir = os.path.join(os.path.dirname(final), f".{os.path.basename(final)}.tmp-{secrets.token_hex(4)}")
+    try:
+        res = make_socket(dataclasses.replace(opts, outdir=tmpdir))
+        fields = dataclasses.asdict(res)
+        # Content digests for /static ETags, so downloads never hash files on the request path
+        fields["digests"] = {
+            os.path.basename(v): sha256_file(v) for k, v in fields.items() if k.endswith("_path") and v
+        }
+        with open(os.path.join(tmpdir, "result.json"), "w", encoding="utf-8") as f:
+            json.dump(fields, f)
+        try:
+            os.rename(tmpdir, final)
+        except OSError:
+            # Another worker finished the same request first; keep its outputs
+            res = _load_cached_result(final)
+            if res is None:
+                raise
+            return res
+        res = _load_cached_result(final)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    # Compressed copies are written in the background; until they exist /static serves the raw files
+    _IO_POOL.submit(
+        _precompress,
+        [res.socket_inner_path, res.socket_outer_path, res.socket_trimmed_path, res.sections_csv_path, res.provenance_path],
+    )
+    return res
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
-@app.post("/api/make-socket")
+@app.post("/api/make-socket", status_code=202)
 async def api_make_socket(
     file: Optional[UploadFile] = File(default=None),
     limb_path: Optional[str] = Form(default=None),
@@ -62,40 +472,37 @@ async def api_make_socket(
     marks_json: Optional[str] = Form(default=None),
     marks_units: Optional[str] = Form(default="mm"),
 ):
-    dbg_id = uuid.uuid4().hex[:8]
+    dbg_id = secrets.token_hex(4)
     logger.info("[%s] POST /api/make-socket", dbg_id)
     if not file and not limb_path:
         raise HTTPException(status_code=400, detail="Provide file upload or limb_path.")
+    if len(_RUNNING_TASKS) >= _GEN_QUEUE_MAX:
+        logger.warning("[%s] %d tasks unfinished, shedding request", dbg_id, len(_RUNNING_TASKS))
+        raise HTTPException(
+            status_code=503,
+            detail="Busy generating other sockets; retry later.",
+            headers={"Retry-After": str(_GEN_RETRY_AFTER_S)},
+        )
+    now = time.monotonic()
+    if now >= _PRUNE_AT[0]:
+        _PRUNE_AT[0] = now + 3600.0
+        _IO_POOL.submit(_prune_tasks)
 
     # Resolve input path
     if file is not None:
-        suffix = os.path.splitext(file.filename or "upload.glb")[1] or ".glb"
-        stem = os.path.splitext(file.filename or "upload")[0]
-        ts = time.strftime("%Y%m%d-%H%M%S")
-        unique = f"{stem}_{ts}_{uuid.uuid4().hex[:8]}{suffix}"
-        save_path = os.path.join(UPLOADS_DIR, unique)
-        content = await file.read()
-        with open(save_path, "wb") as f:
-            f.write(content)
-        limb_abs = save_path
+        name = Path(file.filename or "upload.glb")
+        ts = _ts()
+        save_path = _UPLOADS_P / f"{name.stem}_{ts}_{secrets.token_hex(4)}{name.suffix or '.glb'}"
+        await _save_upload(file, str(save_path))
+        # The digest taken for the content-addressed name also keys the output directory
+        limb_abs, digest = await asyncio.get_running_loop().run_in_executor(
+            _IO_POOL, _store_upload, str(save_path), name.suffix or '.glb'
+        )
     else:
-        # limb_path is relative to DATA_ROOT or absolute
-        raw = (limb_path or "").strip()
-        lp = Path(raw)
-        # On Windows, a path like '/foo' has empty drive and root '/', treat as relative
-        if not lp.is_absolute() or (not lp.drive and lp.root == '/'):
-            limb_abs = str(Path(DATA_ROOT) / raw.lstrip('/\\'))
-        else:
-            limb_abs = str(lp)
-        # Fallbacks: try testModel/ and webviewer/public if not found
-        if not os.path.exists(limb_abs):
-            name = os.path.basename(raw.lstrip('/\\'))
-            cand1 = str(Path(DATA_ROOT) / 'testModel' / name)
-            cand2 = str(Path(DATA_ROOT) / 'webviewer' / 'public' / name)
-            if os.path.exists(cand1):
-                limb_abs = cand1
-            elif os.path.exists(cand2):
-                limb_abs = cand2
+        # limb_path is relative to DATA_ROOT or absolute, with fallbacks to testModel/ and webviewer/public
+        limb_abs = await asyncio.get_running_loop().run_in_executor(
+            _IO_POOL, _resolve_limb_path, (limb_path or "").strip()
+        )
 
     logger.info(
         "[%s] DATA_ROOT=%s limb_path_in=%s resolved=%s exists=%s",
@@ -107,38 +514,27 @@ async def api_make_socket(
     )
     if not os.path.exists(limb_abs):
         raise HTTPException(status_code=404, detail=f"Input file not found: {limb_abs}")
-
-    # Prepare output directory (unique)
-    base_name = os.path.splitext(os.path.basename(limb_abs))[0]
-    ts = time.strftime("%Y%m%d-%H%M%S")
-    outdir = os.path.join(OUT_DIR, f"{base_name}_{ts}_{uuid.uuid4().hex[:6]}")
-    os.makedirs(outdir, exist_ok=True)
+    if not os.path.isfile(limb_abs):
+        raise HTTPException(status_code=400, detail=f"Input path is not a file: {limb_abs}")
 
     # Build options and call make_socket
     opts = MakeSocketOptions(
         limb_path=limb_abs,
-        outdir=outdir,
+        outdir="",
         base_clearance_mm=float(base_clearance_mm),
         wall_thickness_mm=float(wall_mm),
         trim_z_mm=float(trim_z_mm) if trim_z_mm is not None else None,
         voxel_mm=float(voxel_mm) if voxel_mm is not None else None,
         decimate_preview=False,
+        assume_units=assume_units,
+        scale_factor=float(scale_factor) if scale_factor is not None else None,
     )
-    # Attach scaling hints used by make_socket()
-    if assume_units is not None:
-        setattr(opts, "assume_units", assume_units)
-    if scale_factor is not None:
-        try:
-            setattr(opts, "scale_factor", float(scale_factor))
-        except Exception:
-            pass
 
     # Parse marks if provided
     parsed_marks = None
     if marks_json:
         try:
-            import json as _json
-            parsed_marks = _json.loads(marks_json)
+            parsed_marks = json.loads(marks_json)
             if not isinstance(parsed_marks, list):
                 parsed_marks = None
         except Exception as e:
@@ -146,64 +542,63 @@ async def api_make_socket(
             parsed_marks = None
     if parsed_marks:
         # store in opts; make_socket/make_shell will consume in mm; we'll scale centers to mm after we know scale_applied
-        setattr(opts, 'marks', parsed_marks)
-        setattr(opts, 'marks_units', marks_units or 'mm')
+        opts.marks = parsed_marks
+        opts.marks_units = marks_units or 'mm'
+
+    # Output directory keyed on input content and options, so a repeat request reuses the earlier
+    # result; make_socket creates it when the generation starts
+    if file is None:
+        digest = await asyncio.get_running_loop().run_in_executor(_IO_POOL, _path_digest, limb_abs)
+    opts.outdir = str(_OUT_P / _output_key(opts, digest))
+
+    # Reply right away with a task handle; the client polls status_url for the result, so
+    # proxy or client timeouts no longer cut off a long generation
+    tid = secrets.token_hex(8)
+    await asyncio.get_running_loop().run_in_executor(_IO_POOL, _write_task, tid, {"task_id": tid, "status": "pending"})
+    task = asyncio.create_task(_run_task(tid, dbg_id, _generate(tid, dbg_id, opts, parsed_marks, marks_units)))
+    _RUNNING_TASKS.add(task)
+    task.add_done_callback(_RUNNING_TASKS.discard)
+    return {"task_id": tid, "status_url": f"/api/tasks/{tid}"}
+
+
+async def _generate(
+    tid: str,
+    dbg_id: str,
+    opts: MakeSocketOptions,
+    parsed_marks: Optional[list],
+    marks_units: Optional[str],
+) -> Dict[str, Any]:
+    """Run make_socket for a task and build the result payload served by /api/tasks/{id}."""
+    limb_abs, outdir = opts.limb_path, opts.outdir
+    res = await asyncio.get_running_loop().run_in_executor(_IO_POOL, _load_cached_result, outdir)
+    if res is not None:
+        logger.info("[%s] reusing outputs in %s", dbg_id, outdir)
+    else:
+        try:
+            res = await asyncio.get_running_loop().run_in_executor(_GEN_POOL, _run_generation, tid, opts)
+        except Exception as e:
+            logger.exception("[%s] make_socket failed: %s", dbg_id, e)
+            tb = traceback.format_exc()
+            raise HTTPException(status_code=500, detail=f"Generation failed: {e}\n{tb}")
 
-    try:
-        res = make_socket(opts)
-    except Exception as e:
-        logger.exception("[%s] make_socket failed: %s", dbg_id, e)
-        tb = traceback.format_exc()
-        raise HTTPException(status_code=500, detail=f"Generation failed: {e}\n{tb}")
-
-    # Build static URLs (we mount DATA_ROOT at /static)
-    def to_static_url(p: str) -> str:
-        # Return path relative to DATA_ROOT
-        rel = os.path.relpath(p, DATA_ROOT).replace("\\", "/")
-        return f"/static/{rel}"
-
-    # Extract scale_applied from provenance for viewer alignment
-    scale_applied = 1.0
-    try:
-        import json as _json
-        with open(res.provenance_path, "r", encoding="utf-8") as f:
-            prov = _json.load(f)
-        scale_applied = float(prov.get("params", {}).get("scale_applied", 1.0))
-    except Exception:
-        pass
-
-    # Compute centers in mm for limb and socket (bbox centers) for alignment
-    limb_center_mm = None
-    socket_center_mm = None
-    try:
-        import trimesh as _tm
-        _limb = _tm.load(limb_abs, force="mesh")
-        if isinstance(_limb, _tm.Scene):
-            _limb = _tm.util.concatenate(tuple(m for m in _limb.dump().geometry.values()))
-        if scale_applied and abs(scale_applied - 1.0) > 1e-9:
-            _limb = _limb.copy(); _limb.apply_scale(scale_applied)
-        lb = _limb.bounds
-        limb_center_mm = [float((lb[0][i] + lb[1][i]) * 0.5) for i in range(3)]
-
-        _sock = _tm.load(res.socket_trimmed_path, force="mesh")
-        if isinstance(_sock, _tm.Scene):
-            _sock = _tm.util.concatenate(tuple(m for m in _sock.dump().geometry.values()))
-        sb = _sock.bounds
-        socket_center_mm = [float((sb[0][i] + sb[1][i]) * 0.5) for i in range(3)]
-    except Exception as e:
-        logger.warning("[%s] center compute failed: %s", dbg_id, e)
+    # Input scaling (also recorded in provenance) for viewer alignment
+    scale_applied = res.scale_applied
+
+    # Centers in mm for limb and socket (bbox centers) for alignment, measured by make_socket
+    limb_center_mm = res.limb_center_mm
+    socket_center_mm = res.socket_center_mm
 
     # Delta (socket minus limb) in mm
     delta_mm = None
     if limb_center_mm and socket_center_mm:
-        delta_mm = [socket_center_mm[i] - limb_center_mm[i] for i in range(3)]
+        delta_mm = np.subtract(socket_center_mm, limb_center_mm).tolist()
 
     resp = {
-        "socket_inner_url": to_static_url(res.socket_inner_path),
-        "socket_outer_url": to_static_url(res.socket_outer_path),
-        "socket_trimmed_url": to_static_url(res.socket_trimmed_path),
-        "sections_csv_url": to_static_url(res.sections_csv_path),
-        "provenance_url": to_static_url(res.provenance_path),
+        "socket_inner_url": _to_static_url(res.socket_inner_path),
+        "socket_outer_url": _to_static_url(res.socket_outer_path),
+        "socket_trimmed_url": _to_static_url(res.socket_trimmed_path),
+        "sections_csv_url": _to_static_url(res.sections_csv_path),
+        "provenance_url": _to_static_url(res.provenance_path),
         "stats": res.stats,
         "input_path": limb_abs,
         "outdir": outdir,
@@ -220,27 +615,39 @@ async def api_make_socket(
     return resp
 
 
+@app.get("/api/tasks/{tid}")
+def api_task_status(tid: str):
+    """State of a make-socket task; once status is "done" it carries the full result payload."""
+    if not _TASK_ID_RE.match(tid):
+        raise HTTPException(status_code=404, detail="Unknown task.")
+    path = _TASKS_P / f"{tid}.json"
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+        age = time.time() - os.stat(path).st_mtime
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Unknown task.")
+    if state.get("status") in ("pending", "running") and age > _TASK_STALE_S:
+        # No heartbeat: the worker process that owned the task is gone
+        state = {"task_id": tid, "status": "error", "status_code": 500, "detail": "Task was lost; submit it again."}
+    return state
+
+
 @app.post("/api/markings/detect")
 async def api_markings_detect(
     glb_file: UploadFile = File(...),
 ):
-    dbg_id = uuid.uuid4().hex[:8]
+    dbg_id = secrets.token_hex(4)
     logger.info("[%s] POST /api/markings/detect", dbg_id)
     if not glb_file:
         raise HTTPException(status_code=400, detail="Provide glb_file upload.")
-    suffix = os.path.splitext(glb_file.filename or "upload.glb")[1] or ".glb"
-    stem = os.path.splitext(glb_file.filename or "upload")[0]
-    ts = time.strftime("%Y%m%d-%H%M%S")
-    unique = f"{stem}_{ts}_{uuid.uuid4().hex[:8]}{suffix}"
-    save_path = os.path.join(UPLOADS_DIR, unique)
-    content = await glb_file.read()
-    with open(save_path, "wb") as f:
-        f.write(content)
-    # Outputs
-    outdir = os.path.join(OUT_DIR, f"markings_{ts}_{uuid.uuid4().hex[:6]}")
-    os.makedirs(outdir, exist_ok=True)
-    overlay_glb = os.path.join(outdir, "overlay.glb")
-    anno_json = os.path.join(outdir, "annotations.json")
+    name = Path(glb_file.filename or "upload.glb")
+    ts = _ts()
+    save_path = str(_UPLOADS_P / f"{name.stem}_{ts}_{secrets.token_hex(4)}{name.suffix or '.glb'}")
+    # Outputs; the directory is created while the upload is being written
+    outdir = _OUT_P / f"markings_{ts}_{secrets.token_hex(3)}"
+    await asyncio.gather(_save_upload(glb_file, save_path), aos.makedirs(outdir, exist_ok=True))
+    overlay_glb = str(outdir / "overlay.glb")
+    anno_json = str(outdir / "annotations.json")
     # For MVP, pass-through; detection will write empty annotations
     try:
         summary = detect_markings_from_glb(save_path, overlay_glb, anno_json, color_profiles=None)
@@ -248,32 +655,96 @@ async def api_markings_detect(
         logger.exception("[%s] detection failed: %s", dbg_id, e)
         raise HTTPException(status_code=500, detail=f"Marking detection failed: {e}")
 
-    def to_static_url(p: str) -> str:
-        rel = os.path.relpath(p, DATA_ROOT).replace("\\", "/")
-        return f"/static/{rel}"
     return {
-        "annotations_url": to_static_url(anno_json),
-        "overlay_glb_url": to_static_url(save_path if not os.path.exists(overlay_glb) else overlay_glb),
+        "annotations_url": _to_static_url(anno_json),
+        "overlay_glb_url": _to_static_url(save_path if not os.path.exists(overlay_glb) else overlay_glb),
         "summary": summary,
     }
 
 
+def _accepts_encoding(header: str, coding: str) -> bool:
+    """Whether an Accept-Encoding header allows coding: listed (or covered by "*") with q > 0."""
+    qs: Dict[str, float] = {}
+    for item in header.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qs[name] = q
+    return qs.get(coding, qs.get("*", 0.0)) > 0.0
+
+
+class DataStaticFiles(StaticFiles):
+    """StaticFiles tuned for multi-MB mesh outputs: serves precompressed siblings when accepted."""
+
+    async def get_response(self, path, scope):
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        if scope["method"] in ("GET", "HEAD"):
+            for encoding, ext in (("br", ".br"), ("gzip", ".gz")):
+                if not _accepts_encoding(accept_encoding, encoding):
+                    continue
+                try:
+                    full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + ext)
+                except (OSError, ValueError):
+                    continue
+                if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+                    continue
+                response = self.file_response(full_path, stat_result, scope)
+                media_type = mimetypes.guess_type(path)[0] or "text/plain"
+                if media_type.startswith("text/"):
+                    media_type += "; charset=utf-8"
+                response.headers["content-type"] = media_type
+                response.headers["content-encoding"] = encoding
+                return response
+        return await super().get_response(path, scope)
+
+    def lookup_path(self, path):
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+            # lookup_path runs in a worker thread: read result.json here so file_response finds
+            # the output digests cached
+            _content_etag(str(full_path))
+        return full_path, stat_result
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        # Vary on every response, identity included, since the same URL may be served precompressed
+        headers = {"vary": "Accept-Encoding"}
+        etag = _content_etag(str(full_path))
+        if etag is not None:
+            # Content-hash ETag where one is on record, instead of Starlette's mtime/size one:
+            # regenerating a byte-identical file keeps the client's cached copy valid
+            headers["etag"] = f'"{etag}"'
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        full_path = str(full_path)
+        if full_path.startswith(OUT_DIR + os.sep) and not full_path.startswith(str(_TASKS_P) + os.sep):
+            # Output directories are named after their inputs and written once, so generated files
+            # never change and clients may keep them without revalidating; task state does change
+            response.headers["cache-control"] = "public, max-age=31536000, immutable"
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        # FileResponse already hands the path to servers offering http.response.pathsend
+        # (zero-copy sendfile); everywhere else, read the file in large chunks
+        response.chunk_size = CHUNK_BYTES
+        return response
+
+
 # Serve /static from DATA_ROOT so the frontend can fetch outputs
-app.mount("/static", StaticFiles(directory=DATA_ROOT), name="static")
+app.mount("/static", DataStaticFiles(directory=DATA_ROOT), name="static")
 
 
 @app.get("/api/debug/resolve")
 def debug_resolve(limb_path: str = Query(..., description="Path as provided by client")):
     raw = limb_path.strip()
-    lp = Path(raw)
-    candidates = []
-    if not lp.is_absolute() or (not lp.drive and lp.root == '/'):
-        candidates.append(str(Path(DATA_ROOT) / raw.lstrip('/\\')))
-    else:
-        candidates.append(str(lp))
-    name = os.path.basename(raw.lstrip('/\\'))
-    candidates.append(str(Path(DATA_ROOT) / 'testModel' / name))
-    candidates.append(str(Path(DATA_ROOT) / 'webviewer' / 'public' / name))
+    name = os.path.basename(raw)
+    candidates = [_limb_path_abs(raw), os.path.join(_TESTMODEL_DIR, name), os.path.join(_WEBVIEWER_DIR, name)]
     hit = next((c for c in candidates if os.path.exists(c)), None)
     return {
         "provided": limb_path,
@@ -288,7 +759,9 @@ def main():
     import uvicorn
 
     port = int(os.environ.get("PORT", "8000"))
-    uvicorn.run("socketlab.src.socketlab.server:app", host="0.0.0.0", port=port, reload=False)
+    # One worker process per core by default; uvicorn picks uvloop/httptools when installed
+    workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+    uvicorn.run("socketlab.src.socketlab.server:app", host="0.0.0.0", port=port, reload=False, workers=workers)
 
 
 if __name__ == "__main__":
@@ -13,13 +13,17 @@ class MakeSocketOptions:
     trim_z_mm: Optional[float] = None
     voxel_mm: Optional[float] = None  # None => auto (0.5–1.0mm based on bbox)
     decimate_preview: bool = False
+    repair_input: bool = False  # fill holes/fix normals on load; voxelization tolerates open meshes
+    # Explicit input scaling; scale_factor wins over assume_units ('mm'|'cm'|'m'), otherwise units are guessed
+    assume_units: Optional[str] = None
+    scale_factor: Optional[float] = None
     # Optional annotations/marks to modulate clearance/trim locally.
     # Format: List of dicts with keys: type ('pad'|'relief'|'trim'), center_mm [x,y,z], radius_mm, amount_mm
     marks: Optional[List[Dict[str, Any]]] = None
     marks_units: Optional[str] = None  # 'mm' or 'native'
 
 
-@dataclass
+@dataclass(frozen=True)
 class MakeSocketResult:
     socket_inner_path: str
     socket_outer_path: str
@@ -27,3 +31,8 @@ class MakeSocketResult:
     sections_csv_path: str
     provenance_path: str
     stats: Dict[str, Any]
+    # Bounding-box centers for viewer alignment: the input limb in its file frame (scaled to mm)
+    # and the trimmed socket in the normalized frame
+    limb_center_mm: Optional[List[float]] = None
+    socket_center_mm: Optional[List[float]] = None
+    scale_applied: float = 1.0  # factor applied to the input to bring it to mm
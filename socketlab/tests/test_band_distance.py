@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from scipy.ndimage import distance_transform_edt
+
+pytest.importorskip("numba")
+
+from socketlab.src.socketlab.offset_voxelize import band_distance
+
+
+@pytest.mark.parametrize(
+    "shape,density,voxel_mm,max_mm",
+    [
+        ((30, 41, 23), 0.01, 0.5, 3.0),
+        ((50, 50, 50), 0.001, 0.5, 7.0),
+        ((17, 9, 33), 0.05, 1.25, 100.0),
+        ((64, 1, 20), 0.02, 0.4, 2.0),
+    ],
+)
+def test_matches_edt_inside_band(shape, density, voxel_mm, max_mm):
+    grid = np.random.default_rng(0).random(shape) < density
+    assert grid.any()
+    got = band_distance(grid, voxel_mm, max_mm)
+    ref = distance_transform_edt(~grid, sampling=voxel_mm)
+
+    assert got.dtype == np.float32
+    inside = ref <= max_mm
+    np.testing.assert_allclose(got[inside], ref[inside], rtol=1e-6, atol=1e-5)
+    # Outside the band only "farther than max_mm" is promised
+    assert (got[~inside] > max_mm).all()
+
+
+def test_shell_surface():
+    # Thin spherical shell, like the voxelized limb surface the offsets start from
+    idx = np.indices((40, 40, 40), dtype=np.float64)
+    r = np.sqrt(((idx - 19.5) ** 2).sum(axis=0))
+    grid = np.abs(r - 12.0) < 0.6
+    got = band_distance(grid, 0.5, 4.0)
+    ref = distance_transform_edt(~grid, sampling=0.5)
+    inside = ref <= 4.0
+    np.testing.assert_allclose(got[inside], ref[inside], rtol=1e-6, atol=1e-5)
+    assert (got[~inside] > 4.0).all()
+
+
+def test_empty_grid_is_beyond_band():
+    got = band_distance(np.zeros((8, 9, 10), dtype=bool), 1.0, 3.0)
+    assert (got > 3.0).all()
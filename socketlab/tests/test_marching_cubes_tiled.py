@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+import trimesh as tm
+from scipy.spatial import cKDTree
+from skimage import measure
+
+from socketlab.src.socketlab.offset import _marching_cubes_tiled
+
+
+def _two_spheres(shape=(61, 53, 47)):
+    """Signed field of two overlapping spheres, sized so several tile seams cross the surface."""
+    idx = np.indices(shape, dtype=np.float64)
+    a = np.sqrt((idx[0] - 24.3) ** 2 + (idx[1] - 25.1) ** 2 + (idx[2] - 22.7) ** 2) - 17.35
+    b = np.sqrt((idx[0] - 40.2) ** 2 + (idx[1] - 28.6) ** 2 + (idx[2] - 24.1) ** 2) - 11.8
+    return np.minimum(a, b).astype(np.float32)
+
+
+@pytest.mark.parametrize("tile", [8, 16, 32])
+def test_tiled_matches_single_call(tile):
+    field = _two_spheres()
+    spacing = (0.5, 0.75, 1.0)
+    V, F = _marching_cubes_tiled(field, spacing, tile=tile)
+    V0, F0, _, _ = measure.marching_cubes(field, level=0.0, spacing=spacing)
+
+    assert V.shape == V0.shape
+    assert F.shape == F0.shape
+    # Pair each tiled vertex with its single-call twin; the pairing must be one-to-one
+    dist, match = cKDTree(V0).query(V)
+    assert dist.max() < 1e-4
+    assert len(np.unique(match)) == len(V0)
+    faces = {tuple(sorted(f)) for f in match[F].tolist()}
+    assert faces == {tuple(sorted(f)) for f in F0.tolist()}
+
+
+def test_tiled_seams_are_merged():
+    V, F = _marching_cubes_tiled(_two_spheres(), (1.0, 1.0, 1.0), tile=8)
+    mesh = tm.Trimesh(vertices=V, faces=F, process=False)
+    assert mesh.is_watertight
+
+
+def test_no_crossing_raises():
+    with pytest.raises(ValueError):
+        _marching_cubes_tiled(np.ones((10, 10, 10), dtype=np.float32), (1.0, 1.0, 1.0))
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+import trimesh as tm
+
+pytest.importorskip("numba")
+
+from socketlab.src.socketlab.offset_voxelize import voxelize_triangles
+
+
+def _meshes():
+    box = tm.creation.box(extents=(13.0, 7.5, 9.0))
+    box.apply_transform(tm.transformations.rotation_matrix(0.6, (1.0, 2.0, 0.5), point=(0.3, 0.1, 0.2)))
+    yield "icosphere", tm.creation.icosphere(subdivisions=3, radius=10.0)
+    yield "rotated_box", box
+    yield "cylinder", tm.creation.cylinder(radius=4.0, height=20.0, sections=24)
+
+
+@pytest.mark.parametrize("name,mesh", list(_meshes()))
+@pytest.mark.parametrize("pitch", [0.5, 1.3])
+def test_sat_voxels_cover_trimesh(name, mesh, pitch):
+    ours = voxelize_triangles(mesh.vertices, mesh.faces, pitch)
+    theirs = mesh.voxelized(pitch=pitch)
+
+    # Both voxelizers put centers on multiples of pitch
+    idx = np.round((np.asarray(theirs.points) - ours.transform[:3, 3]) / pitch).astype(np.int64)
+    assert (idx >= 0).all() and (idx < ours.matrix.shape).all()
+    # Every voxel trimesh marks overlaps a triangle, so the conservative SAT test must mark it too
+    assert ours.matrix[idx[:, 0], idx[:, 1], idx[:, 2]].all()
+
+
+def test_voxels_touch_the_surface():
+    mesh = tm.creation.icosphere(subdivisions=3, radius=10.0)
+    pitch = 0.5
+    ours = voxelize_triangles(mesh.vertices, mesh.faces, pitch)
+    centers = np.argwhere(ours.matrix) * pitch + ours.transform[:3, 3]
+    # A voxel overlapping a triangle has its center within half a diagonal of the surface
+    _, dist, _ = tm.proximity.closest_point(mesh, centers)
+    assert dist.max() <= np.sqrt(3.0) / 2.0 * pitch + 1e-9
@@ -233,7 +233,19 @@ function Viewer() {
         fd.append('marks_units', 'mm')
       }
       const res = await fetch(`${apiHost}/api/make-socket`, { method: 'POST', body: fd })
-      const json = await res.json()
+      let json = await res.json()
+      if (!res.ok) throw new Error(json.detail || `API error ${res.status}`)
+      // Generation runs as a server-side task: poll its status until it finishes, for up to 10 min
+      const statusUrl = json.status_url
+      const deadline = Date.now() + 10 * 60 * 1000
+      while (statusUrl && json.status !== 'done' && json.status !== 'error') {
+        if (Date.now() > deadline) throw new Error('Timed out waiting for the socket')
+        await new Promise(r => setTimeout(r, 1000))
+        const poll = await fetch(`${apiHost}${statusUrl}`)
+        json = await poll.json()
+        if (!poll.ok) throw new Error(json.detail || `Task status error ${poll.status}`)
+      }
+      if (json.status === 'error') throw new Error(json.detail || 'Generation failed')
       setApiResult(json)
       if (json.socket_trimmed_url) {
         const u = json.socket_trimmed_url.startsWith('http') ? json.socket_trimmed_url : `${apiHost}${json.socket_trimmed_url}`